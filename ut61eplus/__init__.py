@@ -1 +1,10 @@
-from .ut61eplus import UT61EPLUS
\ No newline at end of file
+from .ut61eplus import UT61EPLUS
+from .commands import CommandQueue
+from .sequencer import Sequencer, Step
+from .settle import SettleDetector, SettleResult
+from .health import HealthMonitor
+from .metrics import Metrics
+from .models import Model, ModelRegistry
+from .trigger import TriggerEngine
+from .trace import Tracer
+from .compact import pack, unpack
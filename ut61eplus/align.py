@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#
+# Time alignment of several meter streams
+#
+# Every Measurement read from a device carries `received` (time.monotonic() of the
+# HID report) and `timestamp` (received minus the estimated latency of that DMM,
+# see UT61EPLUS.latency). Aligner collects (timestamp, value) per channel and
+# resamples all channels onto one common time grid with numpy.interp, derived
+# channels (power, ratio, ...) are computed on the aligned arrays.
+#
+# needs numpy (pip install -r requirements-align.txt), not imported by the ut61eplus package itself
+#
+# example :
+#   mm = MultiMeter({'v': UT61EPLUS(meter_serial='A'), 'i': UT61EPLUS(meter_serial='B')},
+#                   period=0.1, derive={'p': lambda r: r['v'] * r['i']})
+#   mm.start()
+#   while True:
+#       r = mm.poll()  # None until new aligned samples are available
+#       if r is not None:
+#           print(r['t'], r['p'])
+#
+
+import math
+import time
+import logging
+import threading
+import collections
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError('ut61eplus.align needs numpy: pip install -r requirements-align.txt') from e
+
+
+log = logging.getLogger(__name__)
+
+
+def _float(m) -> float:
+    """value of a measurement as float, NaN in overload"""
+    if m.overload:
+        return math.nan
+    try:
+        return float(m.value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Aligner:
+
+    def __init__(self, channels, period: float, derive=None, history: float=60.0):
+        self.channels = list(channels)
+        self.period = period  # seconds between aligned samples
+        self.derive = derive or {}  # name -> function(result dict) on numpy arrays
+        self.history = history  # seconds of samples kept when a channel stalls
+        self._data = {c: collections.deque() for c in self.channels}  # (timestamp, value)
+        self._next = None  # time of the next aligned sample
+        self._lock = threading.Lock()
+
+    def add(self, channel, m=None, t: float=None, value: float=None):
+        """add a Measurement m (or t/value) of a channel, samples must come in time order"""
+        if m is not None:
+            t = m.timestamp if m.timestamp is not None else time.monotonic()
+            value = _float(m)
+        with self._lock:
+            q = self._data[channel]
+            if q and t <= q[-1][0]:
+                log.debug('[19-1] Drop out of order sample of {}'.format(channel))
+                return
+            q.append((t, value))
+            while q and q[0][0] < t - self.history:
+                q.popleft()
+
+    def poll(self) -> dict:
+        """aligned samples since the last poll {'t': array, channel: array, derived: array}, None if none"""
+        with self._lock:
+            if any(len(q) < 2 for q in self._data.values()):
+                return None
+            start = max(q[0][0] for q in self._data.values())
+            end = min(q[-1][0] for q in self._data.values())  # all channels have data up to here
+            if self._next is None or self._next < start:
+                self._next = math.ceil(start / self.period) * self.period
+            if self._next > end:
+                return None
+            n = int((end - self._next) / self.period) + 1
+            grid = self._next + self.period * np.arange(n)
+            self._next = float(grid[-1]) + self.period
+
+            res = {'t': grid}
+            for c, q in self._data.items():
+                a = np.array(q)
+                res[c] = np.interp(grid, a[:, 0], a[:, 1])
+                # keep the last sample before the next grid point for the next interpolation
+                keep = max(0, int(np.searchsorted(a[:, 0], self._next)) - 1)
+                for _ in range(keep):
+                    q.popleft()
+
+        for name, func in self.derive.items():
+            res[name] = func(res)
+        return res
+
+
+class MultiMeter:
+
+    def __init__(self, dmms: dict, period: float, derive=None):
+        self.dmms = dict(dmms)  # channel name -> UT61EPLUS (or HealthMonitor)
+        self.aligner = Aligner(self.dmms, period, derive)
+        self._threads = []
+        self._running = False
+
+    def _reader(self, name, dmm):
+        while self._running:
+            m = dmm.takeMeasurement()
+            if m is not None:
+                self.aligner.add(name, m)
+
+    def start(self):
+        """read all meters, one thread each, as fast as they answer"""
+        log.info('[19-2] Start reading {}'.format(list(self.dmms)))
+        self._running = True
+        for name, dmm in self.dmms.items():
+            t = threading.Thread(target=self._reader, args=(name, dmm), name='ut61eplus-' + name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._running = False
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def poll(self) -> dict:
+        return self.aligner.poll()
+
+    def latencies(self) -> dict:
+        """estimated one way latency per channel in seconds"""
+        return {name: getattr(dmm, 'latency', None) for name, dmm in self.dmms.items()}
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+#
+# Command queue for UT61EPLUS.sendCommand
+#
+# Commands are executed by a worker thread, one transaction at a time, interleaved
+# with takeMeasurement() of the sampling thread (both share the device lock).
+# submit() returns a concurrent.futures.Future which resolves to True when the DMM
+# confirmed the command (AB CD 04 FF 00 02), False when no confirm arrived.
+#
+
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+
+log = logging.getLogger(__name__)
+
+
+class CommandQueue:
+
+    # buttons that flip a state, 2 pending presses cancel each other
+    _TOGGLES = set(['lamp', 'hold', 'rel'])
+
+    # buttons that set a state, a pending press makes another one redundant
+    _IDEMPOTENT = set(['auto', 'not_min_max', 'not_peak'])
+
+    def __init__(self, dmm, start=True):
+        self._dmm = dmm
+        self._lock = threading.Lock()
+        self._pending = []  # [cmd, future] not sent yet, in order
+        self._wakeup = queue.Queue()
+        self._thread = None
+        self._running = False
+        if start:
+            self.start()
+
+    def start(self):
+        if self._thread is None:
+            log.info('[11-1] Command queue start')
+            self._running = True
+            self._thread = threading.Thread(target=self._worker, name='ut61eplus-commands', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        """stop the worker, commands not sent yet are cancelled"""
+        log.info('[11-2] Command queue stop')
+        self._running = False
+        self._wakeup.put(None)
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._thread = None
+        with self._lock:
+            for cmd, future in self._pending:
+                future.cancel()
+            self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, cmd) -> Future:
+        """queue a command (name from UT61EPLUS._COMMANDS or code), coalesced with pending ones"""
+        with self._lock:
+            # only the last pending command is coalesced, any command in between may
+            # change the state the repeated one acts on (e.g. rel, select1, rel)
+            if self._pending and self._pending[-1][0] == cmd and not self._pending[-1][1].cancelled():
+                pfuture = self._pending[-1][1]
+                if cmd in self._TOGGLES and pfuture.set_running_or_notify_cancel():
+                    # press + press = no change, neither needs to be sent
+                    self._pending.pop()
+                    log.debug('[11-3] Coalesce toggle: {}'.format(cmd))
+                    pfuture.set_result(True)
+                    future = Future()
+                    future.set_result(True)
+                    return future
+                if cmd in self._IDEMPOTENT:
+                    log.debug('[11-3] Coalesce repeated command: {}'.format(cmd))
+                    return pfuture
+            future = Future()
+            self._pending.append([cmd, future])
+        self._wakeup.put(cmd)
+        return future
+
+    def pending(self) -> int:
+        """number of commands not sent yet"""
+        with self._lock:
+            return len(self._pending)
+
+    def _worker(self):
+        while self._running:
+            self._wakeup.get()
+            while self._running:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    cmd, future = self._pending.pop(0)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._dmm.sendCommand(cmd))
+                except Exception as e:
+                    log.error('[11-4] Command {0} failed: {1}'.format(cmd, e))
+                    future.set_exception(e)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+#
+# Compact binary payload of a measurement
+#
+# Fixed 18 byte record (little endian), taken straight from the frame of the DMM :
+#   version   u8   record version (1)
+#   time      f64  epoch seconds
+#   mode      u8   mode code (1st byte of the frame, index into the model mode table)
+#   range     u8   range digit (2nd byte of the frame minus '0')
+#   mantissa  i32  displayed digits as integer, e.g. '-8.595' => -8595
+#   exponent  i8   power of 10 of the mantissa, e.g. -3
+#   flags     u16  Measurement.flags, bit 12 overload, bit 13 NCV level
+# value in display unit = mantissa * 10**exponent, the display unit comes from the
+# model tables (mode, range). Records have a fixed size, several records can be
+# sent in one message. SCHEMA describes the record, publish it next to the data.
+#
+# example :
+#   payload = pack(m)
+#   unpack(payload, registry().get('UT61E+'))
+#
+
+import time
+import struct
+import decimal
+
+from .ut61eplus import Measurement
+
+
+VERSION = 1
+
+_RECORD = struct.Struct('<BdBBibH')
+
+SIZE = _RECORD.size
+
+FLAG_OVERLOAD = 1 << 12
+FLAG_NCV = 1 << 13
+
+# bit -> name of Measurement.flags, see Measurement.flags
+_FLAGS = {
+    0: 'isRel', 1: 'isHold', 2: 'isMin', 3: 'isMax',
+    4: 'hasHVWarning', 5: 'hasBatteryWarning', 6: 'notAuto',
+    8: 'isBarPol', 9: 'isMinPeak', 10: 'isMaxPeak', 11: 'isDC',
+    12: 'overload', 13: 'ncv',
+}
+
+
+def schema(model=None) -> dict:
+    """description of the record for consumers, includes the decode tables of model"""
+    return {
+        'version': VERSION,
+        'struct': _RECORD.format,
+        'size': SIZE,
+        'fields': ['version', 'time', 'mode', 'range', 'mantissa', 'exponent', 'flags'],
+        'value': 'mantissa * 10**exponent in units[modes[mode]][str(range)]',
+        'flags': {str(bit): name for bit, name in _FLAGS.items()},
+        'model': None if model is None else model.name,
+        'modes': Measurement._MODE if model is None else model.modes,
+        'units': Measurement._UNITS if model is None else model.units,
+    }
+
+
+def pack(m, ts: float=None) -> bytes:
+    """record of Measurement m at epoch seconds ts (default now)"""
+    b = m.binary
+    flags = m.flags
+    mantissa = 0
+    exponent = 0
+    if m.overload:
+        flags |= FLAG_OVERLOAD
+    elif isinstance(m.display_decimal, decimal.Decimal):
+        sign, digits, exponent = m.display_decimal.as_tuple()
+        mantissa = int(''.join(map(str, digits)) or 0)
+        if sign:
+            mantissa = -mantissa
+    else:  # NCV level 0..5
+        flags |= FLAG_NCV
+        mantissa = m.display_decimal
+    return _RECORD.pack(VERSION, time.time() if ts is None else ts, b[0], b[1] - 0x30, mantissa, exponent, flags)
+
+
+def unpack(payload: bytes, model=None, offset: int=0) -> dict:
+    """decode one record, display unit and mode name from the model tables (default UT61E+)"""
+    version, ts, mode, rng, mantissa, exponent, flags = _RECORD.unpack_from(payload, offset)
+    if version != VERSION:
+        raise ValueError('unknown record version {}'.format(version))
+    modes = Measurement._MODE if model is None else model.modes
+    units = Measurement._UNITS if model is None else model.units
+    mode_name = modes[mode] if mode < len(modes) else str(mode)
+    res = {
+        'time': ts,
+        'mode': mode_name,
+        'range': str(rng),
+        'unit': units.get(mode_name, {}).get(str(rng)),
+        'value': None if flags & FLAG_OVERLOAD else decimal.Decimal(mantissa).scaleb(exponent),
+    }
+    for bit, name in _FLAGS.items():
+        res[name] = bool(flags >> bit & 1)
+    return res
+
+
+def unpack_all(payload: bytes, model=None) -> list:
+    """decode a message of several records"""
+    if len(payload) % SIZE:
+        raise ValueError('payload size {0} is not a multiple of {1}'.format(len(payload), SIZE))
+    return [unpack(payload, model, i) for i in range(0, len(payload), SIZE)]
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#
+# Cached device discovery
+#
+# Enumerating all HID devices takes seconds on some systems. The device paths found
+# for a VID/PID (in enumeration order, with HID serial and the name answered by the
+# DMM) are kept in $XDG_CACHE_HOME/ut61eplus/devices.json and reused by the next
+# run. A cached path is validated by opening it (vendor/product id must match), on
+# any mismatch the devices are enumerated again and the cache is rewritten.
+#
+# The entries are also the index to address a DMM independent of the enumeration
+# order: by device path, by HID serial of the cable or by the serial answered by the
+# meter (queried once per cable and kept in the entry). Entries of cables missing in
+# an enumeration (unplugged for a moment, powered hub) are kept as not present, so
+# the answers of their DMMs are still known when they come back.
+#
+
+import os
+import json
+import logging
+import threading
+
+from .models import cache_dir
+
+
+log = logging.getLogger(__name__)
+
+
+class DeviceCache:
+
+    _KEEP_ABSENT = 16  # entries of cables not present in the last enumeration, latest first
+
+    def __init__(self, path=None, persist=True):
+        self.path = path or os.path.join(cache_dir(), 'devices.json')
+        self.persist = persist  # False = only in memory, e.g. UT61EPLUS(cache=False)
+        self._data = None if persist else {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(vid: int, pid: int) -> str:
+        return '{:04X}:{:04X}'.format(vid, pid)
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                with open(self.path, encoding='utf-8') as src:
+                    self._data = json.load(src)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def save(self):
+        if not self.persist:
+            return
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp = self.path + '.tmp'
+                with open(tmp, 'w', encoding='utf-8') as dst:
+                    json.dump(self._load(), dst, indent=1)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                log.warning('[17-1] Device cache {0} not written: {1}'.format(self.path, e))
+
+    def known(self, vid: int, pid: int) -> list:
+        """all cached entries {'path', 'serial', 'present', 'name', 'meter_serial'}, present ones first"""
+        return self._load().get(self._key(vid, pid), [])
+
+    def devices(self, vid: int, pid: int) -> list:
+        """cached entries of the cables present in the last enumeration, in enumeration order"""
+        return [e for e in self.known(vid, pid) if e.get('present', True)]
+
+    def store(self, vid: int, pid: int, hid_devices):
+        """remember enumerated devices, keeps the DMM answers of paths already known (also of absent ones)"""
+        old = {e['path']: e for e in self.known(vid, pid)}
+        entries = []
+        for d in hid_devices:
+            entry = {'path': d.device_path, 'serial': d.serial_number, 'present': True}
+            for key in ('name', 'meter_serial'):  # answers of the DMM, only known after a query
+                if d.device_path in old and old[d.device_path].get(key) is not None:
+                    entry[key] = old[d.device_path][key]
+            entries.append(entry)
+        paths = set(e['path'] for e in entries)
+        absent = [dict(e, present=False) for e in old.values() if e['path'] not in paths]
+        # just gone before the ones absent already, stable otherwise
+        absent.sort(key=lambda e: not old[e['path']].get('present', True))
+        self._load()[self._key(vid, pid)] = entries + absent[:self._KEEP_ABSENT]
+        self.save()
+
+    def entry(self, vid: int, pid: int, path: str) -> dict:
+        for e in self.known(vid, pid):
+            if e['path'] == path:
+                return e
+        return None
+
+    def update(self, vid: int, pid: int, path: str, **info):
+        """add info (e.g. name=) to the entry of path"""
+        e = self.entry(vid, pid, path)
+        if e is not None and any(e.get(k) != v for k, v in info.items()):
+            e.update(info)
+            self.save()
+
+    def forget(self, vid: int, pid: int, path: str, *keys):
+        """remove info (e.g. 'meter_serial') from the entry of path, it is queried again"""
+        e = self.entry(vid, pid, path)
+        if e is not None and any(k in e for k in keys):
+            for k in keys:
+                e.pop(k, None)
+            self.save()
+
+    def match(self, vid: int, pid: int, path=None, serial=None, meter_serial=None) -> int:
+        """index in devices() of the present entry with all given identities, -1 when none matches"""
+        for i, e in enumerate(self.devices(vid, pid)):
+            if path is not None and e['path'] != path:
+                continue
+            if serial is not None and e.get('serial') != serial:
+                continue
+            if meter_serial is not None and e.get('meter_serial') != meter_serial:
+                continue
+            return i
+        return -1
+
+    def clear(self, vid: int, pid: int):
+        self._load().pop(self._key(vid, pid), None)
+        self.save()
+
+
+_cache = None
+
+
+def device_cache() -> DeviceCache:
+    """shared DeviceCache"""
+    global _cache
+    if _cache is None:
+        _cache = DeviceCache()
+    return _cache
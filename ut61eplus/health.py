@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+#
+# Connection health monitor
+#
+# Wraps a UT61EPLUS, tracks timeout/checksum error rates of the last requests and
+# recovers the connection without a process restart :
+#   cable_gone : HID device unplugged   => enumerate again (HidDeviceFilter) and reopen
+#   meter_off  : cable present, DMM does not answer (auto power off) => probe again
+# Both are retried with exponential backoff, in between requests return None at once
+# instead of blocking on the 1 second read timeout.
+#
+# example :
+#   dmm = HealthMonitor(UT61EPLUS())
+#   m = dmm.takeMeasurement()  # None while the DMM is not reachable
+#
+
+import time
+import logging
+import collections
+
+
+log = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+
+    OK = 'ok'
+    DEGRADED = 'degraded'  # answers, but with errors
+    METER_OFF = 'meter_off'
+    CABLE_GONE = 'cable_gone'
+
+    def __init__(self, dmm, window=20, failures=3, backoff=0.5, backoff_max=8.0):
+        self.dmm = dmm
+        self.state = self.OK if dmm.isPlugged() else self.CABLE_GONE
+        self._window = collections.deque(maxlen=window)  # 1 = request failed, 0 = ok
+        self._failures = failures  # consecutive failures until the DMM counts as lost
+        self._consecutive = 0
+        self._backoff_min = backoff
+        self._backoff_max = backoff_max
+        self._backoff = backoff
+        self._next_try = 0.0
+        self._errors = dict(dmm.errors)
+        self.reconnects = 0
+
+    def errorRate(self) -> float:
+        """part of failed requests in the window, 0.0 ... 1.0"""
+        if not self._window:
+            return 0.0
+        return sum(self._window) / len(self._window)
+
+    def errorDelta(self) -> dict:
+        """errors of the DMM (timeout, checksum, frame) since the last call"""
+        now = dict(self.dmm.errors)
+        delta = {k: now[k] - self._errors.get(k, 0) for k in now}
+        self._errors = now
+        return delta
+
+    def _setState(self, state):
+        if state != self.state:
+            log.warning('[14-1] DMM state {0} -> {1}'.format(self.state, state))
+            self.state = state
+
+    def _schedule(self):
+        self._next_try = time.monotonic() + self._backoff
+        log.info('[14-2] Next try in {:.1f} second'.format(self._backoff))
+        self._backoff = min(self._backoff * 2, self._backoff_max)
+
+    def _recover(self) -> bool:
+        """try to get the DMM back, returns True when a request may be sent"""
+        if time.monotonic() < self._next_try:
+            return False
+        if self.state == self.CABLE_GONE or not self.dmm.isPlugged():
+            self._setState(self.CABLE_GONE)
+            if not self.dmm.reconnect():
+                self._schedule()
+                return False
+            self.reconnects += 1
+            self.dmm.metrics.inc('reconnects')
+            log.info('[14-3] HID device reopened')
+        return True
+
+    def _record(self, ok: bool):
+        self._window.append(0 if ok else 1)
+        if ok:
+            self._consecutive = 0
+            self._backoff = self._backoff_min
+            delta = self.errorDelta()
+            self._setState(self.DEGRADED if self.errorRate() > 0 or any(delta.values()) else self.OK)
+            return
+        self._consecutive += 1
+        if self._consecutive >= self._failures:
+            self._setState(self.METER_OFF if self.dmm.isPlugged() else self.CABLE_GONE)
+            self._schedule()
+        else:
+            self._setState(self.DEGRADED)
+
+    def _call(self, func, *args):
+        if self.state in (self.METER_OFF, self.CABLE_GONE) and not self._recover():
+            return None
+        try:
+            res = func(*args)
+        except Exception as e:  # pywinusb raises when writing to an unplugged device
+            log.error('[14-4] DMM request failed: {}'.format(e))
+            res = None
+        self._record(res is not None and res is not False)
+        return res
+
+    def takeMeasurement(self):
+        """like UT61EPLUS.takeMeasurement, None while the DMM is not reachable"""
+        return self._call(self.dmm.takeMeasurement)
+
+    def sendCommand(self, cmd) -> bool:
+        return bool(self._call(self.dmm.sendCommand, cmd))
+
+    def getName(self):
+        return self._call(self.dmm.getName)
+
+    def close(self):
+        self.dmm.close()
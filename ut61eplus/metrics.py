@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+#
+# Runtime metrics of UT61EPLUS
+#
+# Counters for events (timeouts [6-3], checksum mismatches [5-3-7], receive overflow
+# [2-2-4], ...) and HDR style latency histograms per operation (takeMeasurement,
+# sendCommand, getName). Latencies are kept in log-linear buckets (8 sub buckets per
+# power of 2 microseconds, ~12% precision) so recording is O(1) with bounded memory.
+#
+# render_openmetrics() formats the metrics of one or more DMMs for Prometheus,
+# serve() exposes them on http://host:port/metrics
+#
+# example :
+#   dmm = UT61EPLUS()
+#   print(dmm.metrics.snapshot())
+#   serve(9100, [({'device': 'UT61E+'}, dmm.metrics)])
+#
+
+import time
+import logging
+import threading
+import contextlib
+
+
+log = logging.getLogger(__name__)
+
+
+class Histogram:
+
+    _SUB_BITS = 3  # 2^3 = 8 sub buckets per power of 2
+
+    # exported bucket bounds in microseconds, powers of 2 from ~1 ms to ~4 s
+    _EXPORT_US = [1 << k for k in range(10, 23)]
+
+    def __init__(self):
+        self._counts = {}  # bucket index -> count
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, us: int) -> int:
+        e = us.bit_length() - 1  # 2^e <= us < 2^(e+1)
+        if e < cls._SUB_BITS:
+            return us  # exact below 8 us
+        sub = (us >> (e - cls._SUB_BITS)) - (1 << cls._SUB_BITS)
+        return ((e - cls._SUB_BITS + 1) << cls._SUB_BITS) + sub
+
+    @classmethod
+    def _upper(cls, index: int) -> int:
+        """exclusive upper bound of a bucket in microseconds"""
+        if index < (1 << cls._SUB_BITS):
+            return index + 1
+        e = (index >> cls._SUB_BITS) + cls._SUB_BITS - 1
+        sub = index & ((1 << cls._SUB_BITS) - 1)
+        return ((1 << cls._SUB_BITS) + sub + 1) << (e - cls._SUB_BITS)
+
+    def record(self, seconds: float):
+        us = max(1, int(seconds * 1e6))
+        i = self._index(us)
+        self._counts[i] = self._counts.get(i, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """upper bound of the bucket holding the q-th percentile (0..100), in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        n = 0
+        for i in sorted(self._counts):
+            n += self._counts[i]
+            if n >= rank:
+                return min(self._upper(i) / 1e6, self.max)
+        return self.max
+
+    def buckets(self) -> list:
+        """cumulative [(upper bound seconds, count)] on the export bounds"""
+        res = []
+        items = sorted((self._upper(i), c) for i, c in self._counts.items())
+        n = 0
+        j = 0
+        for bound in self._EXPORT_US:
+            while j < len(items) and items[j][0] <= bound:
+                n += items[j][1]
+                j += 1
+            res.append((bound / 1e6, n))
+        return res
+
+
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # event name -> count
+        self.histograms = {}  # operation -> Histogram
+        self.started = time.time()
+        self._last_sample = None
+        self.sample_rate = 0.0  # measurements per second, moving average of the received samples
+
+    def inc(self, name: str, n: int=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def count(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def observe(self, op: str, seconds: float):
+        with self._lock:
+            h = self.histograms.get(op)
+            if h is None:
+                h = self.histograms[op] = Histogram()
+            h.record(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, op: str):
+        """record the duration of the with block as latency of op"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(op, time.perf_counter() - start)
+
+    def sample(self):
+        """count one measurement and update the sample rate"""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_sample is not None and now > self._last_sample:
+                rate = 1.0 / (now - self._last_sample)
+                self.sample_rate = rate if not self.sample_rate else 0.9 * self.sample_rate + 0.1 * rate
+            self._last_sample = now
+            self.counters['measurements'] = self.counters.get('measurements', 0) + 1
+
+    def _rate(self, now: float) -> float:
+        """sample_rate, decays with the time since the last sample when samples stop (lock held)"""
+        if self._last_sample is None or not self.sample_rate:
+            return 0.0
+        idle = now - self._last_sample
+        if idle * self.sample_rate > 1.0:  # next sample overdue
+            return 1.0 / idle
+        return self.sample_rate
+
+    def rate(self) -> float:
+        """measurements per second, drops towards 0 while no samples arrive"""
+        with self._lock:
+            return self._rate(time.monotonic())
+
+    def _export(self):
+        """consistent copy for render_openmetrics: counters, rate, [(op, buckets, count, sum)]"""
+        with self._lock:
+            histograms = [(op, h.buckets(), h.count, h.sum) for op, h in sorted(self.histograms.items())]
+            return dict(self.counters), self._rate(time.monotonic()), histograms
+
+    def snapshot(self) -> dict:
+        """plain dict of all metrics, latencies in seconds"""
+        with self._lock:
+            res = {
+                'counters': dict(self.counters),
+                'sample_rate': self._rate(time.monotonic()),
+                'latency': {},
+            }
+            for op, h in self.histograms.items():
+                res['latency'][op] = {
+                    'count': h.count,
+                    'mean': h.sum / h.count if h.count else 0.0,
+                    'min': h.min,
+                    'p50': h.percentile(50),
+                    'p90': h.percentile(90),
+                    'p99': h.percentile(99),
+                    'max': h.max,
+                }
+            return res
+
+
+def _labels(labels: dict, **extra) -> str:
+    items = dict(labels)
+    items.update(extra)
+    if not items:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items.items()) + '}'
+
+
+def render_openmetrics(sources) -> str:
+    """OpenMetrics text for [(labels dict, Metrics)]"""
+    data = [(labels, m._export()) for labels, m in sources]  # copies, the sampling thread keeps adding
+    lines = []
+    lines.append('# TYPE ut61eplus_events counter')
+    lines.append('# HELP ut61eplus_events HID events: timeout, checksum, frame, overflow, ...')
+    for labels, (counters, rate, histograms) in data:
+        for name, n in sorted(counters.items()):
+            lines.append('ut61eplus_events_total{0} {1}'.format(_labels(labels, kind=name), n))
+    lines.append('# TYPE ut61eplus_sample_rate_hertz gauge')
+    lines.append('# UNIT ut61eplus_sample_rate_hertz hertz')
+    for labels, (counters, rate, histograms) in data:
+        lines.append('ut61eplus_sample_rate_hertz{0} {1:.3f}'.format(_labels(labels), rate))
+    lines.append('# TYPE ut61eplus_request_seconds histogram')
+    lines.append('# UNIT ut61eplus_request_seconds seconds')
+    for labels, (counters, rate, histograms) in data:
+        for op, buckets, count, total in histograms:
+            for bound, n in buckets:
+                lines.append('ut61eplus_request_seconds_bucket{0} {1}'.format(_labels(labels, op=op, le=repr(bound)), n))
+            lines.append('ut61eplus_request_seconds_bucket{0} {1}'.format(_labels(labels, op=op, le='+Inf'), count))
+            lines.append('ut61eplus_request_seconds_count{0} {1}'.format(_labels(labels, op=op), count))
+            lines.append('ut61eplus_request_seconds_sum{0} {1!r}'.format(_labels(labels, op=op), total))
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def serve(port: int, sources, host: str=''):
+    """serve render_openmetrics(sources) on /metrics in a background thread, returns the HTTPServer"""
+    import http.server  # not needed unless exported, keep import of the package fast
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render_openmetrics(sources).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug('[15-2] ' + format, *args)
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='ut61eplus-metrics', daemon=True).start()
+    log.info('[15-1] Metrics exporter on port {}'.format(port))
+    return server
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+#
+# Model registry for the UT61+ / UT161 family
+#
+# Decode and command tables per model are compiled from the files of the android
+# app in from_vendor/ :
+#   funOl_<model>.json  => unit and range name per mode and range, OL limits
+#   anjian_config.json  => which buttons are active per mode
+# Compiling all JSON files takes some milliseconds, the result is cached as pickle
+# (in $XDG_CACHE_HOME/ut61eplus or ~/.cache/ut61eplus) and only rebuilt when a
+# JSON file changes.
+#
+# example :
+#   model = registry().get(dmm.getName())  # 'UT61E+', 'UT161D', ...
+#   model.units['OHM']['1']                # 'kΩ'
+#   model.commands('DCV')                  # buttons usable in DCV
+#
+
+import os
+import glob
+import json
+import pickle
+import logging
+
+
+log = logging.getLogger(__name__)
+
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'from_vendor')
+
+_CACHE_VERSION = 1
+
+
+def cache_dir() -> str:
+    """directory for cached data of this package"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ut61eplus')
+
+
+class Model:
+
+    # button groups of anjian_config.json -> commands of UT61EPLUS._COMMANDS
+    _BUTTONS = {
+        'range': ['range', 'auto'],
+        'rel': ['rel'],
+        'maxmin': ['min_max', 'not_min_max'],
+        'hold': ['hold'],
+        'hzp': ['select2'],
+        'selectFlag': ['select1'],
+    }
+
+    def __init__(self, name, modes, units, ranges=None, limits=None, buttons=None):
+        self.name = name
+        self.modes = modes  # mode code (1st byte of measurement) -> mode name
+        self.units = units  # mode -> range -> displayed unit
+        self.ranges = ranges or {}  # mode -> range -> range name, e.g. '22V'
+        self.limits = limits or {}  # mode -> range -> (max, min) displayed before OL
+        self.buttons = buttons or {}  # mode -> button config from anjian_config.json
+
+    def commands(self, mode) -> list:
+        """commands usable in mode, all commands when the model has no button config"""
+        from .ut61eplus import UT61EPLUS
+        conf = self.buttons.get(mode)
+        if conf is None:
+            return list(UT61EPLUS._COMMANDS)
+        off = set()
+        for key, cmds in self._BUTTONS.items():
+            if not conf.get(key, True):
+                off.update(cmds)
+        return [c for c in UT61EPLUS._COMMANDS if c not in off]
+
+    def __repr__(self):
+        return 'Model({!r})'.format(self.name)
+
+
+def _default_model() -> Model:
+    from .ut61eplus import Measurement
+    return Model('UT61E+', Measurement._MODE, Measurement._UNITS)
+
+
+def compile_models(path=VENDOR_DIR) -> dict:
+    """build Model for every funOl_<model>.json in path, returns name -> Model"""
+    from .ut61eplus import Measurement
+    buttons = {}
+    anjian = os.path.join(path, 'anjian_config.json')
+    if os.path.exists(anjian):
+        with open(anjian, encoding='utf-8') as src:
+            buttons = json.load(src).get('anjian', {})
+
+    models = {}
+    for fname in sorted(glob.glob(os.path.join(path, 'funOl_*.json'))):
+        name = os.path.basename(fname)[len('funOl_'):-len('.json')]
+        with open(fname, encoding='utf-8') as src:
+            ol = json.load(src)['OL']
+        # modes missing in the vendor file (HFE, NCV, ...) keep the UT61E+ units
+        units = {mode: dict(r) for mode, r in Measurement._UNITS.items()}
+        ranges = {}
+        limits = {}
+        for mode, d in ol.items():
+            units[mode] = {r: v[1] for r, v in d.items()}
+            ranges[mode] = {r: v[0] for r, v in d.items()}
+            limits[mode] = {r: (v[2], v[3]) for r, v in d.items()}
+        models[name] = Model(name, Measurement._MODE, units, ranges, limits, buttons.get(name, {}))
+        log.debug('[16-1] Model compiled: {0} modes: {1}'.format(name, len(units)))
+    return models
+
+
+def _signature(path) -> list:
+    files = sorted(glob.glob(os.path.join(path, '*.json')))
+    return [_CACHE_VERSION] + [(os.path.basename(f), os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files]
+
+
+class ModelRegistry:
+
+    def __init__(self, path=VENDOR_DIR, cache=True):
+        self.path = path
+        self._models = None
+        self._cache = os.path.join(cache_dir(), 'models.pickle') if cache else None
+
+    def _load(self) -> dict:
+        if not os.path.isdir(self.path):
+            log.info('[16-2] No vendor files in {}, only UT61E+ known'.format(self.path))
+            return {}
+        sig = _signature(self.path)
+        if self._cache and os.path.exists(self._cache):
+            try:
+                with open(self._cache, 'rb') as src:
+                    cached = pickle.load(src)
+                if cached['signature'] == sig:
+                    log.debug('[16-3] Models loaded from cache {}'.format(self._cache))
+                    return cached['models']
+            except Exception as e:
+                log.warning('[16-4] Model cache {0} unreadable: {1}'.format(self._cache, e))
+        models = compile_models(self.path)
+        if self._cache:
+            try:
+                os.makedirs(os.path.dirname(self._cache), exist_ok=True)
+                tmp = self._cache + '.tmp'
+                with open(tmp, 'wb') as dst:
+                    pickle.dump({'signature': sig, 'models': models}, dst)
+                os.replace(tmp, self._cache)
+            except OSError as e:
+                log.warning('[16-5] Model cache {0} not written: {1}'.format(self._cache, e))
+        return models
+
+    @property
+    def models(self) -> dict:
+        if self._models is None:
+            self._models = self._load()
+            if 'UT61E+' not in self._models:
+                self._models['UT61E+'] = _default_model()
+        return self._models
+
+    def names(self) -> list:
+        return sorted(self.models)
+
+    def get(self, name) -> Model:
+        """Model for the name answered by getName(), None when unknown"""
+        if name is None:
+            return None
+        model = self.models.get(name.strip())
+        if model is None:
+            log.warning('[16-6] Unknown model {!r}, use UT61E+ tables'.format(name))
+        return model
+
+
+_registry = None
+
+
+def registry() -> ModelRegistry:
+    """shared ModelRegistry for from_vendor/"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
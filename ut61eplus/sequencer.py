@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+#
+# Declarative measurement sequencer
+#
+# A plan is a list of Step, each step optionally presses a button, polls the DMM
+# until the Measurement reaches the expected state (e.g. mode/range/isRel) and
+# captures samples. Polling replaces fixed time.sleep() calls, a step takes only
+# as long as the DMM needs to switch.
+#
+# example :
+#   plan = [
+#       Step('select1', expect={'mode': 'ACV'}, presses=3),
+#       Step('range', expect={'range': '1', 'isAuto': False}, presses=4),
+#       Step('rel', expect={'isRel': True}, samples=10),
+#       Step(expect={'isRel': True}, settle=SettleDetector(tolerance=2, samples=5)),
+#   ]
+#   for r in Sequencer(dmm).run(plan):
+#       print(r)
+#
+
+import time
+import logging
+
+from .settle import SettleDetector
+
+
+log = logging.getLogger(__name__)
+
+
+class Step:
+
+    def __init__(self, command=None, expect=None, presses=1, timeout=2.0, settle=0.0, samples=0, name=None):
+        self.command = command  # name from UT61EPLUS._COMMANDS or code, None = only check/capture
+        self.expect = expect or {}  # Measurement attribute -> expected value
+        self.presses = presses  # max button presses to reach expect, for cycling buttons (select, range)
+        self.timeout = timeout  # seconds to wait for a state change after each press, or for the next sample
+        self.settle = settle  # seconds (None = 0) or SettleDetector to wait after the expected state is reached
+        self.samples = samples  # number of measurements to capture
+        self.name = name or str(command)
+
+    def matches(self, m) -> bool:
+        """True when Measurement m is in the expected state"""
+        if m is None:
+            return False
+        for k, v in self.expect.items():
+            if getattr(m, k) != v:
+                return False
+        return True
+
+    def __repr__(self):
+        return 'Step({0!r}, expect={1!r})'.format(self.name, self.expect)
+
+
+class StepResult:
+
+    def __init__(self, step):
+        self.step = step
+        self.ok = False
+        self.presses = 0
+        self.elapsed = 0.0  # seconds for the whole step
+        self.state_time = 0.0  # seconds until the expected state was reached
+        self.measurement = None  # last measurement before capture
+        self.settled = None  # SettleResult when the step settles with a SettleDetector
+        self.samples = []
+
+    def __str__(self):
+        return '{0}: ok={1} presses={2} state_time={3:.3f}s elapsed={4:.3f}s samples={5}'\
+            .format(self.step.name, self.ok, self.presses, self.state_time, self.elapsed, len(self.samples))
+
+
+class Sequencer:
+
+    def __init__(self, dmm, poll=0.0):
+        self._dmm = dmm
+        self._poll = poll  # extra delay between polls, 0 = as fast as the DMM answers
+
+    def _measure(self):
+        m = self._dmm.takeMeasurement()
+        if self._poll > 0:
+            time.sleep(self._poll)
+        return m
+
+    def _waitChange(self, step, before, timeout):
+        """poll until the state differs from before (or matches step), returns last measurement"""
+        deadline = time.monotonic() + timeout
+        m = None
+        while time.monotonic() < deadline:
+            m = self._measure()
+            if m is None:
+                continue
+            if step.matches(m):
+                return m
+            if before is None or any(getattr(m, k) != getattr(before, k) for k in step.expect):
+                return m
+        return m
+
+    def runStep(self, step) -> StepResult:
+        log.info('[12-1] Sequencer step: {}'.format(step))
+        res = StepResult(step)
+        start = time.monotonic()
+
+        m = self._measure()
+        confirmed = True
+        if step.command is not None and not step.expect:
+            # no state to check (e.g. lamp), press the button presses times
+            while res.presses < step.presses:
+                if not self._dmm.sendCommand(step.command):
+                    log.warning('[12-2] Command {} not confirmed'.format(step.command))
+                    confirmed = False
+                res.presses += 1
+            m = self._measure()
+        elif step.command is not None and not step.matches(m):
+            while res.presses < step.presses:
+                if not self._dmm.sendCommand(step.command):
+                    log.warning('[12-2] Command {} not confirmed'.format(step.command))
+                res.presses += 1
+                m = self._waitChange(step, m, step.timeout)
+                if step.matches(m):
+                    break
+        elif step.expect and not step.matches(m):
+            # nothing to press, wait for the DMM (e.g. user turns the dial)
+            deadline = time.monotonic() + step.timeout
+            while not step.matches(m) and time.monotonic() < deadline:
+                m = self._measure()
+
+        res.ok = step.matches(m) if step.expect else m is not None and confirmed
+        res.state_time = time.monotonic() - start
+        res.measurement = m
+        if not res.ok:
+            log.error('[12-3] Step {0} failed after {1} presses, last state: {2}'\
+                .format(step.name, res.presses, None if m is None else (m.mode, m.range)))
+        else:
+            if isinstance(step.settle, SettleDetector):
+                res.settled = step.settle.wait(self._dmm, step.timeout)
+                res.ok = res.settled is not None
+            elif step.settle:  # seconds, None or 0 = no wait
+                time.sleep(step.settle)
+            # give up when no sample arrived for step.timeout (e.g. DMM powered off)
+            deadline = time.monotonic() + step.timeout
+            while len(res.samples) < step.samples and time.monotonic() < deadline:
+                s = self._measure()
+                if s is not None:
+                    res.samples.append(s)
+                    deadline = time.monotonic() + step.timeout
+            if len(res.samples) < step.samples:
+                log.error('[12-5] Step {0} captured {1} of {2} samples'.format(step.name, len(res.samples), step.samples))
+                res.ok = False
+        res.elapsed = time.monotonic() - start
+        log.info('[12-4] {}'.format(res))
+        return res
+
+    def run(self, plan, stop_on_error=True) -> list:
+        """run all steps of plan, returns list of StepResult"""
+        results = []
+        for step in plan:
+            res = self.runStep(step)
+            results.append(res)
+            if not res.ok and stop_on_error:
+                break
+        return results
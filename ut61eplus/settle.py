@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+#
+# Settling / stability detector
+#
+# Feed measurements as they arrive, feed() returns a SettleResult as soon as the
+# last `samples` readings stay within `tolerance` counts of the display resolution
+# (and, if set, the slope is below `slope` counts per second). A change of mode,
+# range, unit (auto ranging) or of auto/manual range restarts the window, overload
+# readings never settle.
+#
+# example :
+#   res = SettleDetector(tolerance=2, samples=5).wait(dmm, timeout=5)
+#   print(res.value, res.unit, res.settle_time)
+#
+
+import time
+import decimal
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+class SettleResult:
+
+    def __init__(self, measurement, settle_time, count, range_changes, overloads):
+        self.measurement = measurement  # last Measurement of the stable window
+        self.settle_time = settle_time  # seconds from first sample to stable
+        self.count = count  # samples consumed
+        self.range_changes = range_changes  # mode/range/auto changes seen, e.g. by auto ranging
+        self.overloads = overloads  # overload readings seen
+
+    @property
+    def value(self) -> decimal.Decimal:
+        return self.measurement.value
+
+    @property
+    def unit(self) -> str:
+        return self.measurement.unit
+
+    def __str__(self):
+        return 'value={0} {1} settle_time={2:.3f}s count={3} range_changes={4} overloads={5}'\
+            .format(self.value, self.unit, self.settle_time, self.count, self.range_changes, self.overloads)
+
+
+class SettleDetector:
+
+    def __init__(self, tolerance=2, samples=5, slope=None):
+        self.tolerance = tolerance  # allowed peak-peak spread in counts of the last display digit
+        self.samples = samples  # consecutive samples within tolerance
+        self.slope = slope  # max drift in counts/second, None = not checked
+        self.reset()
+
+    def reset(self):
+        self._window = []  # (timestamp, display_decimal)
+        self._state = None  # (mode, range, display_unit, isAuto) of the window
+        self._start = None
+        self._count = 0
+        self._range_changes = 0
+        self._overloads = 0
+
+    @staticmethod
+    def resolution(m) -> decimal.Decimal:
+        """one count of the displayed value, e.g. '8.595' => 0.001"""
+        exp = m.display_decimal.as_tuple().exponent
+        return decimal.Decimal(1).scaleb(exp)
+
+    def _slope(self) -> float:
+        """least squares slope of the window in display units per second"""
+        n = len(self._window)
+        t0 = self._window[0][0]
+        ts = [t - t0 for t, v in self._window]
+        vs = [float(v) for t, v in self._window]
+        mt = sum(ts) / n
+        mv = sum(vs) / n
+        den = sum((t - mt) ** 2 for t in ts)
+        if den == 0:
+            return 0.0
+        return sum((t - mt) * (v - mv) for t, v in zip(ts, vs)) / den
+
+    def feed(self, m, ts=None) -> SettleResult:
+        """add a measurement, returns SettleResult when stable, else None"""
+        if m is None:
+            return None
+        if ts is None:
+            ts = time.monotonic()
+        if self._start is None:
+            self._start = ts
+        self._count += 1
+
+        if m.overload or not isinstance(m.display_decimal, decimal.Decimal):
+            self._overloads += m.overload
+            self._window = []
+            return None
+
+        state = (m.mode, m.range, m.display_unit, m.isAuto)
+        if state != self._state:
+            if self._state is not None:
+                self._range_changes += 1
+                log.debug('[13-1] Range change {0} -> {1}, restart window'.format(self._state, state))
+            self._state = state
+            self._window = []
+
+        self._window.append((ts, m.display_decimal))
+        if len(self._window) > self.samples:
+            del self._window[0]
+        if len(self._window) < self.samples:
+            return None
+
+        count = self.resolution(m)
+        values = [v for t, v in self._window]
+        if max(values) - min(values) > self.tolerance * count:
+            return None
+        if self.slope is not None and abs(self._slope()) > self.slope * float(count):
+            return None
+
+        res = SettleResult(m, ts - self._start, self._count, self._range_changes, self._overloads)
+        log.debug('[13-2] Settled: {}'.format(res))
+        return res
+
+    def wait(self, dmm, timeout=10.0) -> SettleResult:
+        """take measurements from dmm until stable, None on timeout"""
+        self.reset()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            res = self.feed(dmm.takeMeasurement())
+            if res is not None:
+                return res
+        log.warning('[13-3] Not settled within {} second'.format(timeout))
+        return None
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+#
+# Trace mode for the HID round trip
+#
+# Opt-in: set `dmm.tracer = Tracer()`. Each takeMeasurement/sendCommand then records
+# the time.monotonic() of its stages :
+#   start        request called
+#   lock         device lock acquired (waited for another thread)
+#   write        HID report sent (missing when nothing could be sent, e.g. device not open)
+#   report       response report arrived in the HID callback
+#   parsed       frame taken from the queue and checked
+#   measurement  Measurement built (takeMeasurement only)
+#   timeout      no response within the read timeout, ends the span instead of report/parsed
+# Requests slower than `slow` seconds are always kept, the others only every
+# `sample`-th, so tracing can stay on in production. Kept spans can be exported
+# as Chrome trace (chrome://tracing, ui.perfetto.dev) or JSON lines.
+#
+# example :
+#   dmm.tracer = Tracer(name='meter1', slow=0.2, sample=100)
+#   ...
+#   dmm.tracer.export_chrome('trace.json')
+#   print(dmm.tracer.summary())
+#
+
+import json
+import time
+import logging
+import threading
+import collections
+
+
+log = logging.getLogger(__name__)
+
+
+class Span:
+
+    __slots__ = ('op', 'thread', 'stages')
+
+    def __init__(self, op: str):
+        self.op = op
+        self.thread = threading.get_ident()
+        self.stages = [('start', time.monotonic())]
+
+    def mark(self, stage: str, t: float=None):
+        """record stage at time t (default now)"""
+        self.stages.append((stage, time.monotonic() if t is None else t))
+
+    @property
+    def start(self) -> float:
+        return self.stages[0][1]
+
+    @property
+    def duration(self) -> float:
+        return self.stages[-1][1] - self.stages[0][1]
+
+    def to_dict(self) -> dict:
+        return {
+            'op': self.op,
+            'start': self.start,
+            'duration': self.duration,
+            'stages': {name: t - self.start for name, t in self.stages[1:]},
+        }
+
+
+class _NullSpan:
+    """span used while tracing is off, all calls are no-ops"""
+
+    def mark(self, stage, t=None):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+
+    def __init__(self, name: str='ut61eplus', slow: float=0.1, sample: int=1, keep: int=1000):
+        self.name = name  # shown as process name in the Chrome trace
+        self.slow = slow  # seconds, slower requests are always kept
+        self.sample = sample  # keep every n-th of the other requests
+        self.spans = collections.deque(maxlen=keep)
+        self.slow_spans = collections.deque(maxlen=keep)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def begin(self, op: str) -> Span:
+        return Span(op)
+
+    def end(self, span: Span):
+        with self._lock:
+            self.count += 1
+            if span.duration >= self.slow:
+                self.slow_spans.append(span)
+                log.info('[20-1] Slow {0}: {1:.3f} s {2}'.format(span.op, span.duration, span.to_dict()['stages']))
+            elif self.count % self.sample == 0:
+                self.spans.append(span)
+
+    def all(self) -> list:
+        """kept spans, sorted by start"""
+        with self._lock:
+            return sorted(list(self.spans) + list(self.slow_spans), key=lambda s: s.start)
+
+    def summary(self) -> dict:
+        """mean seconds between consecutive stages per operation, e.g. {'takeMeasurement': {'write->report': 0.01}}"""
+        res = {}
+        n = {}
+        for span in self.all():
+            d = res.setdefault(span.op, {})
+            n[span.op] = n.get(span.op, 0) + 1
+            for (a, ta), (b, tb) in zip(span.stages, span.stages[1:]):
+                key = '{0}->{1}'.format(a, b)
+                d[key] = d.get(key, 0.0) + tb - ta
+        for op, d in res.items():
+            for key in d:
+                d[key] /= n[op]
+        return res
+
+    def chrome_events(self) -> list:
+        """Chrome trace events (complete events, microseconds)"""
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self.name, 'args': {'name': self.name}}]
+        for span in self.all():
+            events.append({'name': span.op, 'ph': 'X', 'pid': self.name, 'tid': span.thread,
+                           'ts': span.start * 1e6, 'dur': span.duration * 1e6})
+            for (a, ta), (b, tb) in zip(span.stages, span.stages[1:]):
+                events.append({'name': b, 'cat': span.op, 'ph': 'X', 'pid': self.name, 'tid': span.thread,
+                               'ts': ta * 1e6, 'dur': (tb - ta) * 1e6})
+        return events
+
+    def export_chrome(self, path: str, tracers=()):
+        """write a Chrome trace file, more tracers (other meters) can be added to the same file"""
+        events = self.chrome_events()
+        for t in tracers:
+            events += t.chrome_events()
+        with open(path, 'w', encoding='utf-8') as dst:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, dst)
+
+    def export_jsonl(self, path: str):
+        """append one JSON line per kept span"""
+        with open(path, 'a', encoding='utf-8') as dst:
+            for span in self.all():
+                d = span.to_dict()
+                d['device'] = self.name
+                dst.write(json.dumps(d, separators=(',', ':')) + '\n')
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+#
+# Trigger and event capture
+#
+# TriggerEngine watches the measurement stream, keeps the last `pre` samples in a
+# ring buffer and, when a trigger fires, collects `post` more samples. The event
+# record (pre + trigger + post samples in compact form) is handed to the sinks,
+# e.g. JsonLinesSink (capture file) or a function publishing via MQTT.
+#
+# Triggers fire once when their condition becomes true and are armed again when it
+# is false, so a level stays one event until the signal goes back.
+#
+# example :
+#   engine = TriggerEngine([EdgeTrigger(5), OverloadTrigger()], pre=20, post=50,
+#                          sinks=[JsonLinesSink('events.jsonl')])
+#   while True:
+#       engine.feed(dmm.takeMeasurement())
+#
+
+import json
+import time
+import decimal
+import logging
+import collections
+
+
+log = logging.getLogger(__name__)
+
+
+def _value(m):
+    """measured value as Decimal, None in overload or for NCV"""
+    if m is None or m.overload or not isinstance(m.value, decimal.Decimal):
+        return None
+    return m.value
+
+
+class Trigger:
+
+    name = 'trigger'
+
+    def condition(self, prev, m) -> bool:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return self.name
+
+
+class LevelTrigger(Trigger):
+
+    def __init__(self, level, above=True):
+        self.level = decimal.Decimal(str(level))
+        self.above = above
+        self.name = 'level{0}{1}'.format('>' if above else '<', level)
+
+    def condition(self, prev, m) -> bool:
+        v = _value(m)
+        if v is None:
+            return False
+        return v >= self.level if self.above else v <= self.level
+
+
+class EdgeTrigger(Trigger):
+
+    def __init__(self, level, rising=True):
+        self.level = decimal.Decimal(str(level))
+        self.rising = rising
+        self.name = '{0}:{1}'.format('rise' if rising else 'fall', level)
+
+    def condition(self, prev, m) -> bool:
+        p = _value(prev)
+        v = _value(m)
+        if p is None or v is None:
+            return False
+        if self.rising:
+            return p < self.level <= v
+        return p > self.level >= v
+
+
+class WindowTrigger(Trigger):
+
+    def __init__(self, low, high, inside=False):
+        self.low = decimal.Decimal(str(low))
+        self.high = decimal.Decimal(str(high))
+        self.inside = inside  # False = fire when the value leaves low..high
+        self.name = 'window:{0}:{1}{2}'.format(low, high, ':in' if inside else '')
+
+    def condition(self, prev, m) -> bool:
+        v = _value(m)
+        if v is None:
+            return False
+        return (self.low <= v <= self.high) == self.inside
+
+
+class ModeChangeTrigger(Trigger):
+
+    name = 'mode'
+
+    def condition(self, prev, m) -> bool:
+        return prev is not None and m is not None and (prev.mode, prev.range) != (m.mode, m.range)
+
+
+class OverloadTrigger(Trigger):
+
+    name = 'overload'
+
+    def condition(self, prev, m) -> bool:
+        return m is not None and m.overload
+
+
+class HVWarningTrigger(Trigger):
+
+    name = 'hv'
+
+    def condition(self, prev, m) -> bool:
+        return m is not None and m.hasHVWarning
+
+
+def parse_trigger(spec: str) -> Trigger:
+    """trigger from a command line spec: level>5 level<0.1 rise:5 fall:5 window:1:2 mode overload hv"""
+    if spec.startswith('level>'):
+        return LevelTrigger(spec[6:], above=True)
+    if spec.startswith('level<'):
+        return LevelTrigger(spec[6:], above=False)
+    parts = spec.split(':')
+    if parts[0] in ('rise', 'fall') and len(parts) == 2:
+        return EdgeTrigger(parts[1], rising=parts[0] == 'rise')
+    if parts[0] == 'window' and len(parts) in (3, 4):
+        return WindowTrigger(parts[1], parts[2], inside=len(parts) == 4 and parts[3] == 'in')
+    simple = {'mode': ModeChangeTrigger, 'overload': OverloadTrigger, 'hv': HVWarningTrigger}
+    if spec in simple:
+        return simple[spec]()
+    raise ValueError('bad trigger {!r}'.format(spec))
+
+
+def compact(m, ts, t0) -> list:
+    """[seconds from trigger, value, unit, mode, range, flags] of a measurement"""
+    v = _value(m)
+    if m.overload:
+        value = 'OL'
+    elif v is None:
+        value = m.display
+    else:
+        value = '{0:f}'.format(v)
+    return [round(ts - t0, 4), value, m.unit, m.mode, m.range, m.flags]
+
+
+class TriggerEngine:
+
+    def __init__(self, triggers, pre=50, post=50, sinks=None, device=None):
+        self.triggers = list(triggers)
+        self.post = post  # samples after the trigger
+        self.sinks = list(sinks or [])  # callables receiving the event dict
+        self.device = device  # name in the event record
+        self._ring = collections.deque(maxlen=pre)  # (timestamp, Measurement)
+        self._armed = {id(t): True for t in self.triggers}
+        self._prev = None
+        self._event = None  # event being captured
+        self.events = 0
+
+    def _fire(self, trigger, m, ts, wall):
+        t0 = ts
+        self._event = {
+            'trigger': trigger.name,
+            'time': wall,  # epoch seconds of the trigger sample
+            'device': self.device,
+            'fields': ['dt', 'value', 'unit', 'mode', 'range', 'flags'],
+            'pre': [compact(pm, pts, t0) for pts, pm in self._ring],
+            'sample': compact(m, ts, t0),
+            'post': [],
+            'retriggers': 0,
+            '_t0': t0,
+        }
+        log.info('[18-1] Trigger {0} fired: {1} {2}'.format(trigger.name, m.value, m.unit))
+
+    def _emit(self):
+        event = self._event
+        self._event = None
+        del event['_t0']
+        self.events += 1
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                log.error('[18-2] Event sink failed: {}'.format(e))
+
+    def feed(self, m, ts=None):
+        """add a measurement, returns the event dict when one is complete"""
+        if m is None:
+            return None
+        if ts is None:
+            ts = time.monotonic()
+        wall = time.time()
+        done = None
+
+        fired = []
+        for t in self.triggers:
+            cond = t.condition(self._prev, m)
+            if cond and self._armed[id(t)]:
+                fired.append(t)
+            self._armed[id(t)] = not cond
+
+        if self._event is not None:
+            self._event['post'].append(compact(m, ts, self._event['_t0']))
+            self._event['retriggers'] += len(fired)
+            if len(self._event['post']) >= self.post:
+                done = self._event
+                self._emit()
+        elif fired:
+            self._fire(fired[0], m, ts, wall)
+            if self.post <= 0:
+                done = self._event
+                self._emit()
+
+        self._ring.append((ts, m))
+        self._prev = m
+        return done
+
+    def flush(self):
+        """emit an event still collecting post samples, e.g. at shutdown"""
+        if self._event is not None:
+            self._emit()
+
+
+class JsonLinesSink:
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event):
+        with open(self.path, 'a', encoding='utf-8') as dst:
+            dst.write(json.dumps(event, separators=(',', ':'), ensure_ascii=False) + '\n')
@@ -41,9 +41,23 @@ import time
 import decimal
 import binascii
 import logging
+import threading
+import collections
 
 ##import hid # https://github.com/trezor/cython-hidapi https://trezor.github.io/cython-hidapi/api.html
-import pywinusb.hid as hid
+hid = None  # pywinusb.hid, imported by _hid() on first use to keep the import of this module fast
+
+from .metrics import Metrics
+from . import models
+from .discovery import device_cache, DeviceCache
+from .trace import NULL_SPAN
+
+
+def _hid():
+    global hid
+    if hid is None:
+        import pywinusb.hid as hid
+    return hid
 
 
 log = logging.getLogger(__name__)
@@ -185,7 +199,7 @@ class Measurement:
     @property
     def unit(self)->str:
         """ physical unit of the measurement - e.g. V """
-        return self._data['display_unit']
+        return self._data['unit']
 
     @property
     def value(self)->decimal:
@@ -252,11 +266,31 @@ class Measurement:
         """ unknown """
         return self._data['bar_pol']  # meaning not clear
 
+    @property
+    def received(self)->float:
+        """ time.monotonic() when the frame arrived from HID, None if not read from a device """
+        return self._data['received']
+
+    @property
+    def timestamp(self)->float:
+        """ estimated time.monotonic() of the reading - received minus the DMM latency """
+        return self._data['timestamp']
+
+    @property
+    def flags(self)->int:
+        """ flag bytes as bitmask: bit 0-3 Rel,Hold,Min,Max  bit 4-7 HvWarning,Battery,!Auto  bit 8-11 BarPol,PeakMin,PeakMax,DC """
+        b = self.binary
+        return (b[11] & 0x0f) | (b[12] & 0x0f) << 4 | (b[13] & 0x0f) << 8
+
 
-    def __init__(self, b: bytes):
+    def __init__(self, b: bytes, model=None, received: float=None, timestamp: float=None):
+        modes = self._MODE if model is None else model.modes
+        units = self._UNITS if model is None else model.units
         self._data = {}
         self._data['binary'] = b
-        self._data['mode'] = self._MODE[b[0]]
+        self._data['received'] = received
+        self._data['timestamp'] = timestamp
+        self._data['mode'] = modes[b[0]]
         self._data['range'] = b[1:2].decode('ASCII')
         self._data['display'] = b[2:9].decode('ASCII').replace(' ', '')
         self._data['overload'] = self._data['display'] in self._OVERLOAD
@@ -276,14 +310,15 @@ class Measurement:
         else:
             self._data['display_decimal'] = decimal.Decimal(self.display)
 
-        self._data['display_unit'] = self._UNITS[ self._data['mode'] ].get(self._data['range'])
+        self._data['display_unit'] = units.get(self._data['mode'], {}).get(self._data['range'])
 
         self._data['unit'] = self._data['display_unit']
 
         self._data['decimal'] = self.display_decimal
 
-        if self._data['unit'][0] in self._EXPONENTS and not self._data['overload']:
-            self._data['decimal'] = self._data['decimal'].rotate(self._EXPONENTS[self.unit[0]])
+        if self._data['unit'] and self._data['unit'][0] in self._EXPONENTS and not self._data['overload'] \
+                and len(self._data['unit']) > 1:
+            self._data['decimal'] = self._data['decimal'].scaleb(self._EXPONENTS[self.unit[0]])
             self._data['unit'] = self._data['unit'][1:] # remove first char
 
         self._data['progres'] = b[9] * 10 + b[10]
@@ -371,26 +406,128 @@ class UT61EPLUS:
         'not_peak': 78,     # Peak Off
     }
 
+    # payload of the confirm frame (AB CD 04 FF 00 02) sent for buttons and requests
+    _CONFIRM = b'\xff\x00'
+
+    # payload length of a measurement frame (0x10 minus 2 bytes checksum)
+    _MEASUREMENT_LEN = 14
+
     _hDevice = None
     _hReport = None
+    tracer = None  # trace.Tracer, records the stages of each request when set
     _REC_X64 = [0x00]*64
     _REC_TS = 0
     _REC_QTY = 0
 
-    def __init__(self, vid: int=_VID, pid: int=_PID, device_id=0):
+    def __init__(self, vid: int=_VID, pid: int=_PID, device_id=0, model=None, cache=True,
+                 device_path=None, serial=None, meter_serial=None):
 
         self._VID = vid
         self._PID = pid
+        self._lock = threading.RLock()  # one request/response transaction at a time
+        self._rx_queue = collections.deque()  # (report, time.monotonic()) in arrival order
+        self._rx_ts = None  # time.monotonic() of the last report read
+        self._tx_ts = None  # time.monotonic() of the last write
+        self.latency = None  # estimated one way latency in seconds, half the smoothed round trip
+        self._rx_cond = threading.Condition()
+        self._device_id = device_id
+        # stable identity, used instead of device_id when given
+        self._select = {k: v for k, v in (('path', device_path), ('serial', serial), ('meter_serial', meter_serial))
+                        if v is not None}
+        self.model = model  # models.Model, selected by getName() when None
+        self._model_fixed = model is not None
+        self.metrics = Metrics()  # counters and latency histograms, see metrics.py
+        self._cache = device_cache() if cache else DeviceCache(persist=False)  # device paths and names of the last run
+        self._name = None  # answer of getName()
+        self._name_checked = False  # _name answered by the DMM in this process, not only from the cache
+        self._meter_serial = None  # answer of getSerial()
         log.info("[1-1] Device initial, vid:%04X pid:%04X", self._VID, self._PID)
 
+        if self._connect():
+            entry = self._cache.entry(self._VID, self._PID, self._hDevice.device_path) or {}
+            self._meter_serial = entry.get('meter_serial')
+            if entry.get('name'):
+                self._name = entry['name']
+                log.debug("[1-5] DMM name from cache: {}".format(self._name))
+                if self.model is None:
+                    self.model = models.registry().get(self._name)
+        elif log.isEnabledFor(logging.DEBUG):
+            self.list_all_device()
+
+    def _connect(self) -> bool:
+        """find and open the device, tries the cached device path first"""
+        moved = False  # a cable answered another meter serial than kept in the cache
+        for how in ('cache', 'enumerate', 'probe'):
+            if how == 'probe' and 'meter_serial' not in self._select:
+                break  # only meter serials are learned by asking the cables
+            if not self._find(self._device_id, cached=how == 'cache', probe=how == 'probe', reprobe=moved):
+                continue
+            try:
+                self.open(report_id=0)  # The report_id of CH9329 is fixed to 0
+            except Exception as e:
+                log.warning("[1-6] HID device open failed: {}".format(e))
+                self._hDevice = None
+                continue
+            if how != 'probe' and 'meter_serial' in self._select and not self._checkSerial():
+                self.close()  # the meter was moved to another cable, ask all cables
+                moved = True
+                continue
+            return True
+        return False
+
+    def _checkSerial(self) -> bool:
+        """True when the DMM on the opened cable answers the selected meter serial"""
+        serial = self.getSerial(refresh=True)  # also corrects the cache entry of this cable
+        if serial != self._select['meter_serial']:
+            log.warning("[1-12] Device {0} answers meter serial {1}, expected {2}"\
+                .format(self._hDevice.device_path, serial, self._select['meter_serial']))
+            return False
+        return True
+
+    def _findCached(self, device_id=0) -> bool:
+        entries = self._cache.devices(self._VID, self._PID)
+        if self._select:
+            device_id = self._cache.match(self._VID, self._PID, **self._select)
+            if device_id < 0:
+                return False
+        elif len(entries) <= device_id:
+            return False
+        path = entries[device_id]['path']
+        try:
+            device = _hid().HidDevice(path)
+        except Exception as e:
+            log.debug("[1-7] Cached device path not usable: {0} {1}".format(path, e))
+            return False
+        if getattr(device, 'vendor_id', None) != self._VID or getattr(device, 'product_id', None) != self._PID:
+            log.debug("[1-7] Cached device path not usable: {}".format(path))
+            return False
+        log.info("[1-8] HID device from cache: {}".format(path))
+        self._hDevice = device
+        return True
+
+    def _find(self, device_id=0, cached=False, probe=False, reprobe=False) -> bool:
         '''
         initial for UT-D09A cable (CH9329)
         '''
-        filter = hid.HidDeviceFilter(vendor_id = self._VID, product_id = self._PID)
+        if cached:
+            return self._findCached(device_id)
+        filter = _hid().HidDeviceFilter(vendor_id = self._VID, product_id = self._PID)
         hid_devices = filter.get_devices()
+        self._cache.store(self._VID, self._PID, hid_devices)
         if hid_devices:
             log.info("[1-2] HID devices found: count {0} \n {1}".format(len(hid_devices), hid_devices))
-            if len(hid_devices) > device_id:
+            if self._select:
+                if probe:  # ask cables with unknown meter serial, all when meters were moved
+                    self._probe(hid_devices, reprobe)
+                device_id = self._cache.match(self._VID, self._PID, **self._select)
+                if device_id < 0 and 'meter_serial' in self._select and not probe:
+                    log.info("[1-13] Meter serial {} not known for a present cable".format(self._select['meter_serial']))
+                    return False
+                if device_id < 0:
+                    log.critical("[1-9] Can not setup, no HID device matches {}".format(self._select))
+                    return False
+                self._hDevice = hid_devices[device_id]
+            elif len(hid_devices) > device_id:
                 self._hDevice = hid_devices[device_id]  # found and set the correct id
             else:
                 log.error("[1-3] The device_id parameter({0}) must be less than the number of devices found({1})"\
@@ -406,10 +543,47 @@ class UT61EPLUS:
             log.debug("[1-2-6] version_number: {}".format(self._hDevice.version_number))
             log.debug("[1-2-7] serial_number: {}".format(self._hDevice.serial_number))
             log.debug("[1-2-8] device_path: {}".format(self._hDevice.device_path))
-            self.open(report_id=0)  # The report_id of CH9329 is fixed to 0
+            return True
         else:
             log.critical("[1-4] Can not setup, HID device not found, vid:%04X pid:%04X", self._VID, self._PID)
-            self.list_all_device()
+            return False
+
+    def _probe(self, hid_devices, force=False):
+        """ask the cables without known meter serial (all cables when force) for name and serial
+        of their DMM, kept in the device cache"""
+        for device in hid_devices:
+            entry = self._cache.entry(self._VID, self._PID, device.device_path)
+            if entry is None or (entry.get('meter_serial') is not None and not force):
+                continue
+            log.info("[1-10] Probe HID device: {}".format(device.device_path))
+            self._hDevice = device
+            try:
+                self.open(report_id=0)
+                name = self._query(self._SEQUENCE_GET_NAME)
+                serial = self._decodeSerial(self._query(self._SEQUENCE_GET_SERIAL))
+                if serial is None:  # DMM off or no serial query, ask again next time
+                    self._cache.forget(self._VID, self._PID, device.device_path, 'meter_serial')
+                    continue
+                info = {'meter_serial': serial}
+                if name is not None:
+                    info['name'] = name.decode('ASCII')
+                self._cache.update(self._VID, self._PID, device.device_path, **info)
+            except Exception as e:
+                log.warning("[1-11] Probe of {0} failed: {1}".format(device.device_path, e))
+            finally:
+                self.close()
+
+    @classmethod
+    def discover(cls, vid: int=_VID, pid: int=_PID) -> list:
+        """enumerate the cables, returns the device index [{'path', 'serial', 'present', 'name', 'meter_serial'}]
+
+        name and meter_serial are known for cables opened before (or probed with meter_serial=),
+        cables seen before but not plugged now are listed with present False
+        """
+        hid_devices = _hid().HidDeviceFilter(vendor_id = vid, product_id = pid).get_devices()
+        cache = device_cache()
+        cache.store(vid, pid, hid_devices)
+        return cache.known(vid, pid)
 
     def __del__(self):
         log.debug("[10-1] UT61EPLUS class destruct")
@@ -417,7 +591,7 @@ class UT61EPLUS:
             self.close()
 
     def list_all_device(self):
-        all_hids = hid.find_all_hid_devices()
+        all_hids = _hid().find_all_hid_devices()
         log.info("[9-1] Find all hid devices")
         ##log.debug(all_hids)
         i = 0
@@ -441,11 +615,16 @@ class UT61EPLUS:
                 i += 1
             '''
             ##self._REC_X64 = [0x02]*64
-            self._REC_X64 = data[1:]  # skip report_id , data[0]
-            self._REC_TS = time.time()  # current timestamp
-            self._REC_QTY += 1  # count receive times
-            if self._REC_QTY > 1:
-                log.warning("[2-2-4] Receive data overflow: {}".format(self._REC_QTY))
+            with self._rx_cond:
+                self._REC_X64 = data[1:]  # skip report_id , data[0]
+                self._REC_TS = time.time()  # current timestamp
+                self._rx_queue.append((self._REC_X64, time.monotonic()))
+                self._REC_QTY = len(self._rx_queue)  # reports not read yet
+                self.metrics.inc('reports')
+                if self._REC_QTY > 2:  # a request has at most 2 responses (confirm + data)
+                    self.metrics.inc('overflow')
+                    log.warning("[2-2-4] Receive data overflow: {}".format(self._REC_QTY))
+                self._rx_cond.notify_all()
             log.debug("[2-2-3] store report data to _REC_X64: count {0} \n {1}".format(len(self._REC_X64), self._REC_X64))
 
         log.info("[2-1] HID device open")
@@ -468,11 +647,34 @@ class UT61EPLUS:
     def close(self):
         if self._hDevice:
             log.info("[4-1] HID device close")
-            self._hDevice.close()
+            try:
+                self._hDevice.close()
+            except Exception as e:  # device already gone, e.g. cable unplugged
+                log.warning("[4-3] HID device close failed: {}".format(e))
             self._hDevice = None
+            self._hReport = None
         else:
             log.critical("[4-2] Can not close, No HID devices found")
 
+    @property
+    def errors(self) -> dict:
+        """ error counters since start """
+        return {k: self.metrics.count(k) for k in ('timeout', 'checksum', 'frame')}
+
+    def isPlugged(self) -> bool:
+        """True when the cable (HID device) is still connected"""
+        return self._hDevice is not None and self._hDevice.is_plugged()
+
+    def reconnect(self) -> bool:
+        """close, enumerate the cable again and reopen it, returns True on success"""
+        log.info("[4-4] HID device reconnect")
+        with self._lock:
+            if self._hDevice:
+                self.close()
+            self._flush()
+            self._name_checked = False  # the cable may be plugged to another DMM now
+            return self._connect()
+
     def _write(self, b: bytes):
         buf = [0x20]*65
         log.info("[3-1] HID report writing and sending")
@@ -493,60 +695,45 @@ class UT61EPLUS:
         log.debug("[3-2-2] send data buffer: count {0} \n {1}".format(len(buf), list("{:02X}".format(bi) for bi in buf)))
         if self._hReport:
             self._hReport.set_raw_data(buf)
+            self._tx_ts = time.monotonic()
             self._hReport.send()
             ##time.sleep(0.15)  # wait callback function response, confirm and DMM_Name
             log.debug("[3-3] HID report writing completed")
         else:
             log.critical("[3-4] Can not write and send, No HID report interface found")
 
-    def _read(self, req_refresh=True, clear_qty=True, after_time=0):
+    def _flush(self):
+        """drop reports left over from earlier (timed out) requests"""
+        with self._rx_cond:
+            if self._rx_queue:
+                log.warning("[6-6] Drop stale HID reports: count {}".format(len(self._rx_queue)))
+                self.metrics.inc('stale', len(self._rx_queue))
+                self._rx_queue.clear()
+                self._REC_QTY = 0
+
+    def _read(self, timeout=1.0):
         log.info("[6-1] HID report data getting")
 
         rec_x64 = None
-        if req_refresh:
-            if after_time > 0:
-                for ti in range(20):
-                    if self._REC_TS > after_time:
-                        rec_x64 = self._REC_X64
-                        break
-                    time.sleep(0.05)  # wait receive
-                    ti += 1
-                else:  # for ... else
-                    log.error("[6-3] Timeout 1 second, HID report data not arrived, last time: {0} < request time: {1}"\
-                    .format(self._REC_TS, after_time))
-            else:  # after_time <= 0
-                for ti in range(20):
-                    if self._REC_QTY > 0 :
-                        rec_x64 = self._REC_X64
-                        break
-                    time.sleep(0.05)  # wait receive
-                    ti += 1
-                else:  # for ... else
-                    log.error("[6-4] Timeout 1 second, HID report data not arrived, quantity of report: {0}".format(self._REC_QTY))
-        else:  # not(req_refresh)
-            rec_x64 = self._REC_X64
+        with self._rx_cond:
+            if self._rx_cond.wait_for(lambda: self._rx_queue, timeout):
+                rec_x64, self._rx_ts = self._rx_queue.popleft()
+                self._REC_QTY = len(self._rx_queue)
+            else:
+                self.metrics.inc('timeout')
+                log.error("[6-3] Timeout {0} second, HID report data not arrived, last time: {1}"\
+                .format(timeout, self._REC_TS))
 
         if rec_x64:
-            if clear_qty:
-                self._REC_QTY = 0
-            log.debug("[6-2] HID report data read from _REC_X64: Timestemp {0} count {1} \n {2}"\
+            log.debug("[6-2] HID report data read from queue: Timestemp {0} count {1} \n {2}"\
             .format(self._REC_TS, len(rec_x64), list("{:02X}".format(bi) for bi in rec_x64)))
         else:
-            '''---  test data ---'''
-            ##rec_x64 = None
-            ##rec_x64 = [0x05]*64
-            ##rec_x64 = [0x00, 0xab, 0xcd, 0x00, 0x01, 0x78]
-            ##rec_x64 = [0x00, 0xab, 0xcd, 0x03, 0x01, 0x01, 0x7C]
-            ##rec_x64 = [0x00, 0xab, 0xcd, 0x10, 1,2,3,4,5,6,7,8,9,10,11,12,13,14, 0x01, 0xF1]
-            ##rec_x64 = [0x13, 0xab, 0xcd, 0x10, 0x00, 0x30, 0x20, 0x30, 0x2e, 0x30, 0x30, 0x31, 0x30, 0x00, 0x00, 0x30, 0x30, 0x30, 0x03, 0x87]
-            ##log.debug("[6-5-1] HID report (test data), rec_x64: count {0} \n {1}".format(len(rec_x64), list("{:02X}".format(bi) for bi in rec_x64)))
-            '''------------------'''
             log.error("[6-5] HID report data buffer, _REC_X64: Timestemp {0} count {1} \n {2}"\
             .format(self._REC_TS, len(self._REC_X64), list("{:02X}".format(bi) for bi in self._REC_X64)))
 
-        return rec_x64  ##self._REC_X64
+        return rec_x64
 
-    def _readResponse(self) -> bytes:
+    def _readResponse(self, timeout=1.0) -> bytes:
         # pylint: disable=unsupported-assignment-operation,unsubscriptable-object
         state = 0  # 0=init 1=0xAB received 2=0xCD received 3=we have length
         buf: bytes = None
@@ -556,10 +743,11 @@ class UT61EPLUS:
         log.info("[5-1] Extract data from receive report")
         ##while True:
         log.debug("[5-2] HID report reading")
-        ##x = self._read(req_refresh=True, clear_qty=True, after_time=time.time())
-        x = self._read(req_refresh=True, clear_qty=True, after_time=0)
+        x = self._read(timeout)
         log.debug("[5-3] HID report reading completed")
         if not(x) or len(x) < 6:
+            if x:  # None is a timeout, counted by _read
+                self.metrics.inc('frame')
             log.error('[5-4] HID report data is incorrect, ({0}) length should be at least 6'\
             .format(list("{:02X}".format(bi) for bi in x) if x else None))
             return None
@@ -577,6 +765,7 @@ class UT61EPLUS:
             elif state == 2:
                 buf = bytearray(b)  # length of data , if (b + 2) != x[0]: log.error('length error')
                 if b < 3 or b > 60:
+                    self.metrics.inc('frame')
                     log.error('[5-3-4] length of data is incorrect ({0}), length should be 4~16'.format(b))
                     return None
                 index = 0
@@ -589,44 +778,144 @@ class UT61EPLUS:
                     recevied_sum = (buf[-2] << 8) + buf[-1]
                     log.debug('[5-3-6] calculated sum=%04X expected sum=%04X', sum, recevied_sum)
                     if sum != recevied_sum:
+                        self.metrics.inc('checksum')
                         log.warning('[5-3-7] checksum mismatch')
                         return None
                     return buf[:-2]  # drop last 2 bytes at end with checksum
             else:
+                self.metrics.inc('frame')
                 log.error('[5-5] Unexpected byte (0x%02X) in state (%i)', b, state)
                 return None
         else:  # for ... else
+            self.metrics.inc('frame')
             log.error("[5-6] Can not extract data from receive report in state ({0}), raw data: count {1} \n {2}"\
             .format(state, len(x), list("{:02X}".format(bi) for bi in x)))
             return None
 
 
-    def getName(self):
-        # pylint: disable=unused-variable
-        """get name of multimeter"""
+    def _isConfirm(self, frame) -> bool:
+        return frame is not None and bytes(frame) == self._CONFIRM
+
+    def _isMeasurement(self, frame) -> bool:
+        return frame is not None and len(frame) == self._MEASUREMENT_LEN
+
+    def _readFrame(self, expect, timeout=1.0, skip=None) -> bytes:
+        """read frames until one matches expect(frame), frames matching skip(frame) are
+        passed over silently, frames of other requests are dropped"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remain = deadline - time.monotonic()
+            if remain <= 0:
+                log.error('[5-7] No expected frame within {} second'.format(timeout))
+                return None
+            frame = self._readResponse(remain)
+            if frame is None:  # timeout or garbage, try again until deadline
+                continue
+            if expect(frame):
+                return frame
+            if skip is not None and skip(frame):
+                log.debug('[5-9] Skip frame: {}'.format(list("{:02X}".format(bi) for bi in frame)))
+                continue
+            self.metrics.inc('dropped')
+            log.warning('[5-8] Drop unexpected frame: {}'.format(list("{:02X}".format(bi) for bi in frame)))
+
+    def _query(self, seq: bytes) -> bytearray:
+        """send a request answered by confirm and data, returns the data frame"""
+        with self._lock:
+            self._flush()
+            self._write(seq)
+            # 1st response confirm (07 AB CD 04 FF 00 02 7B), 2nd the data; the confirm is
+            # optional, when it is lost or corrupted the data frame is still taken
+            return self._readFrame(lambda b: not(self._isConfirm(b) or self._isMeasurement(b)),
+                                   skip=self._isConfirm)
+
+    def getName(self, refresh=False):
+        """get name of multimeter, asked once per process (the cached name of the last run is
+        checked) and again with refresh; the cached name is returned when the DMM does not answer"""
+        if self._name is not None and not refresh and self._name_checked:
+            return self._name
         log.info('[7-1] Get name of DMM (Digital Multimeter)')
-        self._write(self._SEQUENCE_GET_NAME)
-        confirm = self._readResponse()  # 1st response, confirm : 07 AB CD 04 FF 00 02 7B
-        log.debug('[7-2] DMM response, confirm: {}'.format(confirm))
-        ##time.sleep(0.2)  # wait 2nd response from DMM
-        name = self._readResponse()  # 2nd response, name : 0B AB CD 08 55 54 36 31 45 2B 03 00
+        with self.metrics.timer('getName'):
+            name = self._query(self._SEQUENCE_GET_NAME)  # 2nd response, name : 0B AB CD 08 55 54 36 31 45 2B 03 00
         log.debug('[7-3] DMM response, name: {}'.format(name))
         if isinstance(name, bytearray):
-            return name.decode('ASCII')  # name: "UT61E+" (55 54 36 31 45 2B)
+            name = name.decode('ASCII')  # name: "UT61E+" (55 54 36 31 45 2B)
+            if self._name is not None and name != self._name:
+                # cable moved to another DMM, the meter serial kept for it is outdated too
+                log.warning('[7-9] DMM name {0} differs from cached name {1}'.format(name, self._name))
+                self._meter_serial = None
+                if self._hDevice is not None:
+                    self._cache.forget(self._VID, self._PID, self._hDevice.device_path, 'meter_serial')
+            if not self._model_fixed and (self.model is None or name != self._name):
+                self.model = models.registry().get(name)
+                log.info('[7-5] DMM model: {}'.format(self.model))
+            self._name = name
+            self._name_checked = True
+            if self._hDevice is not None:
+                self._cache.update(self._VID, self._PID, self._hDevice.device_path, name=name)
+            return name
         else:
             log.error('[7-4] DMM no response, name type error !')
+            return self._name
+
+    @staticmethod
+    def _decodeSerial(frame) -> str:
+        if frame is None:
+            return None
+        if all(32 <= b < 127 for b in frame):
+            return bytes(frame).decode('ASCII').strip()
+        return bytes(frame).hex()  # format of the answer not known, keep it comparable
+
+    def getSerial(self, refresh=False):
+        """get serial of multimeter (answer to AB CD 03 5D 01 D8), cached like getName()"""
+        if self._meter_serial is not None and not refresh:
+            return self._meter_serial
+        log.info('[7-6] Get serial of DMM')
+        serial = self._decodeSerial(self._query(self._SEQUENCE_GET_SERIAL))
+        log.debug('[7-7] DMM response, serial: {}'.format(serial))
+        if serial is None:
+            log.error('[7-8] DMM no response to serial query')
             return None
+        self._meter_serial = serial
+        if self._hDevice is not None:
+            self._cache.update(self._VID, self._PID, self._hDevice.device_path, meter_serial=serial)
+        return serial
 
     def takeMeasurement(self):
         """read measurement from screen"""
-        self._write(self._SEQUENCE_SEND_DATA)
-        b = self._readResponse()
+        tracer = self.tracer
+        span = tracer.begin('takeMeasurement') if tracer else NULL_SPAN
+        with self._lock, self.metrics.timer('takeMeasurement'):
+            span.mark('lock')
+            self._flush()
+            self._tx_ts = None  # set by _write when a report was sent
+            self._write(self._SEQUENCE_SEND_DATA)
+            b = self._readFrame(self._isMeasurement)
+            received = self._rx_ts
+            if self._tx_ts is not None:
+                span.mark('write', self._tx_ts)
+            if b is not None:
+                if self._tx_ts is not None:
+                    rtt = received - self._tx_ts
+                    self.latency = rtt / 2 if self.latency is None else 0.9 * self.latency + 0.1 * rtt / 2
+                span.mark('report', received)
+                span.mark('parsed')
         if b is None:
+            if tracer:
+                span.mark('timeout')
+                tracer.end(span)  # the slowest requests, always kept as slow spans
             return None
-        return Measurement(b)
-
-    def sendCommand(self, cmd)->None:
-        """send command to device"""
+        if self._name is not None and not self._name_checked:
+            self.getName()  # name (and model) from the cache, check it before decoding the 1st answer
+        self.metrics.sample()
+        m = Measurement(b, self.model, received, None if self.latency is None else received - self.latency)
+        if tracer:
+            span.mark('measurement')
+            tracer.end(span)
+        return m
+
+    def sendCommand(self, cmd)->bool:
+        """send command to device, returns True when the DMM confirmed it"""
         log.info('[8-1] Send Command: {}'.format(cmd))
         if cmd in self._COMMANDS:
             cmd = self._COMMANDS[cmd]
@@ -640,18 +929,32 @@ class UT61EPLUS:
         cmd_bytes[1] = cmd >> 8
         cmd_bytes[2] = cmd & 0xff
         seq = self._SEQUENCE_SEND_CMD + cmd_bytes
-        '''
-        for bi in seq:
-            log.debug(bi)
-        '''
         log.debug('[8-1-2] Command data: {}'.format(list("{:02X}".format(bi) for bi in seq)))
-        ##log.debug(seq)
-        self._write(seq)
-        # pylint: disable=unused-variable
-        confirm = self._readResponse()  # response, confirm : 07 AB CD 04 FF 00 02 7B
+        tracer = self.tracer
+        span = tracer.begin('sendCommand') if tracer else NULL_SPAN
+        with self._lock, self.metrics.timer('sendCommand'):
+            span.mark('lock')
+            self._flush()
+            self._tx_ts = None  # set by _write when a report was sent
+            self._write(seq)
+            confirm = self._readFrame(self._isConfirm)  # response, confirm : 07 AB CD 04 FF 00 02 7B
+            if self._tx_ts is not None:
+                span.mark('write', self._tx_ts)
+            if confirm is not None:
+                span.mark('report', self._rx_ts)
+                span.mark('parsed')
+            else:
+                span.mark('timeout')
+        if tracer:
+            tracer.end(span)
         log.debug('[8-2] DMM response, confirm: {}'.format(confirm))
-        ##time.sleep(0.2)  # wait other response from DMM
+        self.metrics.inc('commands')
+        if confirm is None:
+            self.metrics.inc('unconfirmed')
+            log.error('[8-4] DMM did not confirm command')
+            return False
         log.debug('[8-3] Send Command completed')
+        return True
 
     def _test(self):
         self._write(self._SEQUENCE_GET_NAME)